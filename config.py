@@ -1,15 +1,50 @@
 # config.py
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+# Resolved next to this file so the working directory doesn't matter
+_DOTENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+
+def _load_dotenv(path=_DOTENV_PATH):
+    """Minimal KEY=value loader; variables already set in the environment win."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return
+
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        key = key.strip()
+        if key.startswith("export "):
+            key = key[len("export "):].strip()
+        value = value.strip()
+        if value[:1] in ("'", '"') and value.find(value[0], 1) > 0:
+            # Quoted: keep what's between the quotes, drop any trailing comment
+            value = value[1:value.index(value[0], 1)]
+        else:
+            # Unquoted values may carry a trailing " # comment"
+            value = value.split(" #", 1)[0].rstrip()
+        os.environ.setdefault(key, value)
+
+
+_load_dotenv()
+
+# Snapshot the environment once instead of calling os.getenv per setting
+_env = dict(os.environ)
 
 # Telegram
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_BOT_TOKEN = _env.get("TELEGRAM_BOT_TOKEN")
+TELEGRAM_CHAT_ID = _env.get("TELEGRAM_CHAT_ID")
 
 # Website
-WEBSITE_URL = os.getenv("WEBSITE_URL", "https://ivas.com/login")
-WEBSITE_USERNAME = os.getenv("WEBSITE_USERNAME")
-WEBSITE_PASSWORD = os.getenv("WEBSITE_PASSWORD")
-OTP_PAGE_URL = os.getenv("OTP_PAGE_URL", "https://www.ivasms.com/portal/sms/received")
+WEBSITE_URL = _env.get("WEBSITE_URL", "https://ivas.com/login")
+WEBSITE_USERNAME = _env.get("WEBSITE_USERNAME")
+WEBSITE_PASSWORD = _env.get("WEBSITE_PASSWORD")
+OTP_PAGE_URL = _env.get("OTP_PAGE_URL", "https://www.ivasms.com/portal/sms/received")
+
+# Monitoring
+CHECK_INTERVAL = int(_env.get("CHECK_INTERVAL", "30"))
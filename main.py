@@ -1,11 +1,15 @@
 import os
+import re
 import time
+import random
+import json
+import hashlib
 import logging
 import signal
+import threading
 from datetime import datetime
+from urllib.parse import urlsplit
 
-from playwright.sync_api import sync_playwright, TimeoutError
-import telebot
 import config as settings  # uses constants from config.py
 
 
@@ -15,18 +19,189 @@ logging.basicConfig(
     level=logging.INFO
 )
 
+# Example: adjust this selector to match the OTP container
+MESSAGE_ROW_SELECTOR = "div.message-row"
+
+# Shown once logged in (adjust text if needed)
+INBOX_SELECTOR = "text=My SMS Statistics"
+
+LAST_SEEN_FILE = "last_seen.json"
+
+# Saved cookies/localStorage, so restarts can skip the login form
+STATE_FILE = "state.json"
+
+# Telegram caps a message at 4096 characters; leave room for Markdown
+TELEGRAM_BATCH_LIMIT = 4000
+
+# Retry delay after a failed check doubles from the minimum up to the maximum
+BACKOFF_MIN = 5
+BACKOFF_MAX = 300
+
+# Identical error alerts are sent at most once per window
+ERROR_MUTE_SECONDS = 300
+
+# Scraping only needs text. Images are turned off in Blink rather than via
+# context.route, since any route disables Chromium's HTTP cache
+CHROMIUM_ARGS = ["--blink-settings=imagesEnabled=false"]
+
+# A standalone 4-8 digit run. The lookarounds skip digits that belong to dates,
+# times, decimals and phone numbers (2024-01-02, 12:30, 1.2345, +1415...),
+# while still allowing prefixed codes such as G-123456. re.ASCII keeps \w and
+# \d on the cheap ASCII-only code path.
+OTP_REGEX = re.compile(r"(?<![\w:/.+])(?<!\d-)(\d{4,8})(?![\w:/-]|\.\d)", re.ASCII)
+
+# Notification templates, built once instead of per message
+OTP_TEMPLATE = "⭐ **NEW OTP RECEIVED!** ⭐\n{otp_line}\n```\n{text}\n```"
+OTP_LINE_TEMPLATE = "🔑 OTP Code: `{}`\n"
+
+# True once the newest message row differs from the one seen last
+NEWEST_CHANGED_JS = """
+([selector, latest]) => {
+    const el = document.querySelector(selector);
+    return (el ? el.innerText : null) !== latest;
+}
+"""
+
+
+def message_id(message_text: str) -> str:
+    # Stable across restarts, unlike hash() which is salted per process
+    return hashlib.blake2b(message_text.encode(), digest_size=8).hexdigest()
+
+
+# Last state written to LAST_SEEN_FILE, so unchanged polls skip the write
+_last_written = None
+
+
+def load_last_seen() -> set:
+    global _last_written
+    try:
+        with open(LAST_SEEN_FILE) as f:
+            seen_ids = set(json.load(f)["seen_ids"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return set()
+    _last_written = frozenset(seen_ids)
+    return seen_ids
+
+
+def save_last_seen(seen_ids: set):
+    global _last_written
+    if seen_ids == _last_written:
+        return
+    # Write to a temp file and swap it in so a crash never leaves a torn file
+    tmp_file = LAST_SEEN_FILE + ".tmp"
+    try:
+        with open(tmp_file, "w") as f:
+            json.dump({"seen_ids": sorted(seen_ids)}, f)
+        os.replace(tmp_file, LAST_SEEN_FILE)
+    except OSError as e:
+        # Best effort: the in-memory set still prevents duplicates this run
+        logging.error(f"Failed to save {LAST_SEEN_FILE}: {e}")
+        return
+    _last_written = frozenset(seen_ids)
+
+
+def is_parse_error(response) -> bool:
+    # Telegram answers 400 "can't parse entities" for malformed Markdown
+    return (
+        response is not None
+        and response.status_code == 400
+        and "can't parse entities" in response.text
+    )
+
+
+def same_page(url: str, target: str) -> bool:
+    """Compare URLs by host and path, ignoring scheme, query, "www." and a trailing slash."""
+    a, b = urlsplit(url), urlsplit(target)
+    host_a = (a.hostname or "").removeprefix("www.")
+    host_b = (b.hostname or "").removeprefix("www.")
+    return host_a == host_b and a.path.rstrip("/") == b.path.rstrip("/")
+
+
+def load_session_state():
+    """Return the saved Playwright session, discarding the file if it's corrupt."""
+    try:
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Discarding unreadable {STATE_FILE}: {e}")
+        try:
+            os.remove(STATE_FILE)
+        except OSError:
+            pass
+        return None
+
 
 class TelegramNotifier:
     def __init__(self, token, chat_id):
-        self.bot = telebot.TeleBot(token)
+        import requests  # deferred until a notifier is built
+
+        # One keep-alive session so each send reuses the TLS connection
+        self.session = requests.Session()
+        self.token = token
+        self.url = f"https://api.telegram.org/bot{token}/sendMessage"
         self.chat_id = chat_id
 
-    def send(self, message: str):
+    def send(self, message: str, parse_mode="Markdown"):
+        """Send one message; return the API response, or None if the request failed."""
+        payload = {"chat_id": self.chat_id, "text": message}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
         try:
-            self.bot.send_message(self.chat_id, message, parse_mode="Markdown")
-            logging.info("Sent Telegram message.")
+            response = self.session.post(self.url, json=payload, timeout=10)
         except Exception as e:
-            logging.error(f"Failed to send Telegram message: {e}")
+            # Connection errors quote the request URL, which embeds the token
+            error = str(e).replace(self.token, "<token>") if self.token else e
+            logging.error(f"Failed to send Telegram message: {error}")
+            return None
+        if response.ok:
+            logging.info("Sent Telegram message.")
+        else:
+            logging.error(f"Telegram API error {response.status_code}: {response.text}")
+        return response
+
+    def send_batch(self, messages: list) -> int:
+        """Send messages packed into as few Telegram messages as fit the limit.
+
+        Stops at the first delivery failure and returns how many messages, from
+        the front of the list, were delivered; the rest should be retried later.
+        """
+        delivered = 0
+        batch = []
+        size = 0
+        for message in messages:
+            if batch and size + len(message) > TELEGRAM_BATCH_LIMIT:
+                sent = self.send_packed(batch)
+                delivered += sent
+                if sent < len(batch):
+                    return delivered
+                batch = []
+                size = 0
+            batch.append(message)
+            size += len(message) + 2
+        if batch:
+            delivered += self.send_packed(batch)
+        return delivered
+
+    def send_packed(self, batch: list) -> int:
+        """Send one packed batch; return how many of its messages were delivered."""
+        response = self.send("\n\n".join(batch))
+        if response is not None and response.ok:
+            return len(batch)
+        # Timeouts, 429s and 5xx are retried later as a whole; only a Markdown
+        # error is specific to one message, so isolate it
+        if not is_parse_error(response):
+            return 0
+
+        logging.warning("Telegram could not parse the batch, sending messages one by one.")
+        for delivered, message in enumerate(batch):
+            response = self.send(message)
+            if is_parse_error(response):
+                response = self.send(message, parse_mode=None)
+            if response is None or not response.ok:
+                return delivered
+        return len(batch)
 
 
 class BrowserMonitor:
@@ -34,26 +209,119 @@ class BrowserMonitor:
         self.notifier = notifier
         self.playwright = None
         self.browser = None
+        self.context = None
         self.page = None
-        self.last_message_id = None
-        self.running = True
+        self.page_crashed = False
+        self.seen_ids = load_last_seen()
+        self.latest_message = None
+        # Cache validators from the last OTP page load, for conditional requests
+        self.etag = None
+        self.last_modified = None
+        self.backoff = BACKOFF_MIN
+        self.last_error = None
+        self.last_error_time = 0.0
+        # Set from the signal handler; the loop exits and cleans up on its own
+        self.stop_event = threading.Event()
 
     def start_browser(self):
+        from playwright.sync_api import sync_playwright
+
         self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=True)
-        self.page = self.browser.new_page()
+        self.browser = self.playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+        self.open_page()
         logging.info("Browser started.")
 
+    def open_page(self):
+        """Open a fresh context and page, restoring the saved session if readable."""
+        self.context = self.browser.new_context(storage_state=load_session_state())
+        self.page = self.context.new_page()
+        # A crashed renderer leaves the page open but unusable; flag it for recover()
+        self.page_crashed = False
+        self.page.on("crash", self.on_page_crash)
+
+    def on_page_crash(self, page):
+        logging.error("Page crashed.")
+        if page is self.page:
+            self.page_crashed = True
+
+    def save_session(self):
+        """Write the context's cookies/localStorage so the next start can skip login."""
+        try:
+            state = self.context.storage_state()
+            # Temp file + swap, as for LAST_SEEN_FILE, so a crash never leaves a torn file
+            tmp_file = STATE_FILE + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_file, STATE_FILE)
+        except Exception as e:
+            logging.warning(f"Failed to save {STATE_FILE}: {e}")
+
     def stop_browser(self):
-        if self.browser:
-            self.browser.close()
-        if self.playwright:
-            self.playwright.stop()
-        logging.info("Playwright stopped gracefully.")
+        # Tolerate a browser or driver that already died; cleanup must not raise
+        try:
+            if self.browser:
+                self.browser.close()
+        except Exception as e:
+            logging.warning(f"Error while closing browser: {e}")
+        try:
+            if self.playwright:
+                self.playwright.stop()
+            logging.info("Playwright stopped gracefully.")
+        except Exception as e:
+            logging.warning(f"Error while stopping Playwright: {e}")
+        self.browser = None
+        self.playwright = None
+
+    def recover(self):
+        """Re-login after a failed check, reusing the browser while it is alive."""
+        try:
+            if not self.browser or not self.browser.is_connected():
+                logging.warning("Browser disconnected, restarting Playwright...")
+                self.stop_browser()
+                self.start_browser()
+            elif not self.page or self.page.is_closed() or self.page_crashed:
+                logging.warning("Page closed or crashed, opening a new browser context...")
+                try:
+                    self.context.close()
+                except Exception:
+                    pass
+                self.open_page()
+        except Exception as e:
+            self.notify_error(f"❌ Browser Restart Failed! Error: {e}")
+            logging.error(f"Browser restart error: {e}")
+            return False
+        # Stay quiet on success: recoveries repeat every back-off cycle
+        return self.login(announce=False)
 
-    def login(self):
+    def session_restored(self) -> bool:
+        """Check whether the saved session still opens the OTP page."""
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+        if not os.path.exists(STATE_FILE):
+            return False
+
+        self.page.goto(settings.OTP_PAGE_URL, timeout=60000, wait_until="domcontentloaded")
         try:
-            self.page.goto(settings.WEBSITE_URL, timeout=60000)
+            self.page.wait_for_selector(INBOX_SELECTOR, timeout=5000)
+            return True
+        except PlaywrightTimeoutError:
+            logging.info("Saved session expired, logging in again.")
+            return False
+
+    def login(self, announce=True):
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+        try:
+            if self.session_restored():
+                # The site may have refreshed or extended the cookies; keep them
+                self.save_session()
+                if announce:
+                    self.notifier.send("🌐 Session Restored! Skipped login. Starting continuous OTP monitoring loop.")
+                logging.info("Reused saved session.")
+                return True
+
+            # Field lookups below auto-wait, so don't block on images/scripts loading
+            self.page.goto(settings.WEBSITE_URL, timeout=60000, wait_until="domcontentloaded")
 
             # ✅ Fill login form
             self.page.get_by_label("Email").fill(settings.WEBSITE_USERNAME)
@@ -62,51 +330,186 @@ class BrowserMonitor:
 
             # ✅ First try: wait for inbox element
             try:
-                self.page.wait_for_selector("text=My SMS Statistics", timeout=30000)  # adjust text if needed
+                self.page.wait_for_selector(INBOX_SELECTOR, timeout=30000)
                 logging.info("Inbox detected after login.")
-            except TimeoutError:
+            except PlaywrightTimeoutError:
                 logging.warning("Inbox element not detected, navigating manually to OTP page...")
-                self.page.goto(settings.OTP_PAGE_URL, timeout=60000)
-                self.page.wait_for_selector("text=My SMS Statistics", timeout=30000)
+                self.page.goto(settings.OTP_PAGE_URL, timeout=60000, wait_until="domcontentloaded")
+                self.page.wait_for_selector(INBOX_SELECTOR, timeout=30000)
 
-            self.notifier.send("🌐 Login Successful! Session established. Starting continuous OTP monitoring loop.")
+            self.save_session()
+            if announce:
+                self.notifier.send("🌐 Login Successful! Session established. Starting continuous OTP monitoring loop.")
             logging.info("Login successful.")
             return True
 
         except Exception as e:
-            self.notifier.send(f"❌ Login Failed! Error: {e}")
+            self.notify_error(f"❌ Login Failed! Error: {e}")
             logging.error(f"Login error: {e}")
             return False
 
-    def check_new_messages(self):
+    def fetch_messages(self, refresh=True):
+        """Return the text of every message row on the OTP page, newest first.
+
+        Navigates only when the page is elsewhere; with ``refresh=False`` the
+        DOM already loaded on the OTP page is read as is.
+        """
+        response = None
+        if not same_page(self.page.url, settings.OTP_PAGE_URL):
+            response = self.page.goto(settings.OTP_PAGE_URL, timeout=60000)
+            self.remember_validators(response)
+        elif refresh and self.otp_page_modified():
+            response = self.page.reload(timeout=60000)
+            self.remember_validators(response)
+
+        # An expired session redirects to the login page, which would otherwise
+        # look like an empty inbox; fail so the caller re-logs in
+        if response and response.status in (401, 403):
+            raise RuntimeError(f"OTP page returned HTTP {response.status}, session expired")
+        if not same_page(self.page.url, settings.OTP_PAGE_URL):
+            raise RuntimeError(f"Redirected away from OTP page to {self.page.url}, session expired")
+
+        # One round-trip for every row, whatever the number of messages
+        return self.page.locator(MESSAGE_ROW_SELECTOR).all_inner_texts()
+
+    def remember_validators(self, response):
+        headers = response.headers if response else {}
+        self.etag = headers.get("etag")
+        self.last_modified = headers.get("last-modified")
+
+    def otp_page_modified(self) -> bool:
+        """Ask the server, via a conditional HEAD, whether the OTP page changed.
+
+        Assumes a change when the server sent no validators or the probe fails.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        if not headers:
+            return True
+
+        try:
+            response = self.page.request.head(settings.OTP_PAGE_URL, headers=headers, timeout=30000)
+        except Exception as e:
+            logging.warning(f"Conditional request for OTP page failed: {e}")
+            return True
+
+        if response.status == 304:
+            logging.info("OTP page not modified, skipping reload.")
+            return False
+        return True
+
+    def notify_error(self, message: str):
+        """Send an error alert, muting repeats of the same error for a while."""
+        now = time.monotonic()
+        if message == self.last_error and now - self.last_error_time < ERROR_MUTE_SECONDS:
+            logging.info("Repeated error notification suppressed.")
+            return
+        self.last_error = message
+        self.last_error_time = now
+        self.notifier.send(message)
+
+    def check_new_messages(self, refresh=True) -> bool:
+        """Forward unseen messages; return False if the check failed."""
         try:
-            self.page.goto(settings.OTP_PAGE_URL, timeout=60000)
+            messages = self.fetch_messages(refresh)
 
-            # Example: adjust this selector to match the OTP container
-            messages = self.page.locator("css=div.message-row").all()
+            self.latest_message = messages[0] if messages else None
 
             if not messages:
                 logging.info("No messages found on OTP page.")
-                return
+                return True
+
+            # Steady state: the newest row was already seen, so nothing else is new
+            seen_ids = self.seen_ids
+            newest_id = message_id(messages[0])
+            if newest_id in seen_ids:
+                logging.info("No new OTP detected.")
+                return True
 
-            latest_message = messages[0].inner_text()
-            message_id = hash(latest_message)
+            ids = [newest_id] + [message_id(text) for text in messages[1:]]
 
-            if message_id != self.last_message_id:
-                self.last_message_id = message_id
-                otp_info = self.extract_otp(latest_message)
-                self.notifier.send(otp_info)
-                logging.info("New OTP message sent.")
+            if seen_ids:
+                # Messages are newest first; stop at the first one already seen
+                new_messages = []
+                for msg_id, text in zip(ids, messages):
+                    if msg_id in seen_ids:
+                        break
+                    new_messages.append(text)
             else:
-                logging.info("No new OTP detected.")
+                # First check: only forward the latest message
+                new_messages = messages[:1]
+
+            delivered = self.notifier.send_batch([self.extract_otp(text) for text in reversed(new_messages)])
+            logging.info(f"Sent {delivered} of {len(new_messages)} new OTP message(s).")
+
+            # Only ids still on the page can mark the boundary next time. Batches
+            # go out oldest first, so the undelivered ones are the newest rows;
+            # leave them unseen so the next check retries them.
+            self.seen_ids = set(ids[len(new_messages) - delivered:])
+            save_last_seen(self.seen_ids)
+            return True
 
         except Exception as e:
-            self.notifier.send(f"⚠️ Error while checking OTP messages: {e}")
+            self.notify_error(f"⚠️ Error while checking OTP messages: {e}")
             logging.error(f"Message check error: {e}")
+            return False
+
+    def wait_for_change(self, timeout: float) -> bool:
+        """Block until the newest message row changes in place, or timeout.
+
+        Playwright re-checks the condition on every DOM mutation, so a page
+        that updates live wakes the loop at once; otherwise the timeout acts
+        as the regular polling interval. The wait is sliced into one-second
+        steps so a shutdown request is noticed promptly.
+        """
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+        stop_event = self.stop_event
+        wait_for_function = self.page.wait_for_function
+        arg = [MESSAGE_ROW_SELECTOR, self.latest_message]
+        deadline = time.monotonic() + timeout
+        while not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                wait_for_function(
+                    NEWEST_CHANGED_JS,
+                    arg=arg,
+                    polling="mutation",
+                    timeout=min(remaining, 1) * 1000,
+                )
+                logging.info("OTP page updated in place.")
+                return True
+            except PlaywrightTimeoutError:
+                continue
+            except Exception as e:
+                logging.warning(f"Waiting for OTP page changes failed: {e}")
+                stop_event.wait(remaining)
+                return False
+        return False
 
     def extract_otp(self, message_text: str) -> str:
-        # Very simple extractor – adjust regex/string parsing as needed
-        return f"⭐ **NEW OTP RECEIVED!** ⭐\n\n```\n{message_text}\n```"
+        # Very simple extractor – adjust OTP_REGEX as needed
+        match = OTP_REGEX.search(message_text)
+        otp_line = OTP_LINE_TEMPLATE.format(match.group(1)) if match else ""
+        text = OTP_TEMPLATE.format(otp_line=otp_line, text=message_text)
+        overflow = len(text) - TELEGRAM_BATCH_LIMIT
+        if overflow > 0:
+            # Trim the body rather than the result so the code block stays closed
+            text = OTP_TEMPLATE.format(otp_line=otp_line, text=message_text[:-(overflow + 1)] + "…")
+        return text
+
+    def back_off(self) -> bool:
+        """Wait out the current retry delay; return False if shutdown was requested."""
+        # Jitter so a prolonged outage isn't hammered at fixed intervals
+        delay = self.backoff * random.uniform(0.8, 1.2)
+        logging.info(f"Retrying in {delay:.0f}s.")
+        self.backoff = min(self.backoff * 2, BACKOFF_MAX)
+        return not self.stop_event.wait(delay)
 
     def run(self):
         self.start_browser()
@@ -114,14 +517,32 @@ class BrowserMonitor:
             self.stop_browser()
             return
 
-        while self.running:
-            self.check_new_messages()
-            time.sleep(30)
+        stop_event = self.stop_event
+        check_interval = settings.CHECK_INTERVAL
+
+        # Login may already have landed on the OTP page, so read it as is
+        refresh = False
+        while not stop_event.is_set():
+            if not self.check_new_messages(refresh):
+                # Keep backing off until the session is re-established
+                while self.back_off():
+                    if self.recover():
+                        break
+                refresh = True
+                continue
+
+            self.backoff = BACKOFF_MIN
+            # Reload only when nothing changed in place before the interval ran out
+            refresh = not self.wait_for_change(check_interval)
+
+        # Persist cookies the site re-issued while running, for the next start
+        self.save_session()
+        self.stop_browser()
 
     def shutdown(self, *args):
+        # Runs in signal context: only flag the loop, never touch Playwright here
         logging.info("Shutdown signal received.")
-        self.running = False
-        self.stop_browser()
+        self.stop_event.set()
 
 
 def main():